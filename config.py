@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from functools import lru_cache
 from typing import Optional
 import os
 from dotenv import load_dotenv
@@ -16,6 +17,7 @@ class Config:
     GMAIL_USER: str
     MAX_REQUESTS: int = 100
     EMAIL_RATE_LIMIT: int = 50
+    REDIS_BATCH_SIZE: int = 100
 
     @classmethod
     def from_env(cls):
@@ -31,5 +33,11 @@ class Config:
             SENDER_EMAIL=os.getenv('SENDER_EMAIL', ''),
             GMAIL_USER=os.getenv('GMAIL_USER', ''),
             MAX_REQUESTS=int(os.getenv('MAX_REQUESTS', '100')),
-            EMAIL_RATE_LIMIT=int(os.getenv('EMAIL_RATE_LIMIT', '50'))
+            EMAIL_RATE_LIMIT=int(os.getenv('EMAIL_RATE_LIMIT', '50')),
+            REDIS_BATCH_SIZE=int(os.getenv('REDIS_BATCH_SIZE', '100'))
         )
+
+
+@lru_cache(maxsize=1)
+def get_config() -> Config:
+    return Config.from_env()
@@ -5,14 +5,10 @@ from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
 import pandas as pd
 import streamlit as st
-from dotenv import load_dotenv
 from config import Config
 
 logging.basicConfig(level=logging.ERROR, format='%(asctime)s - %(levelname)s - %(message)s')
 
-load_dotenv()
-config = Config.from_env()
-
 class DataHandler:
     SHEETS_SCOPES = ['https://www.googleapis.com/auth/spreadsheets.readonly']
 
@@ -27,7 +23,17 @@ class DataHandler:
     def extract_sheet_id(self, sheet_url: str) -> str:
         return sheet_url.split("/d/")[1].split("/")[0]
 
+    def column_letter(self, column_number: int) -> str:
+        letters = ''
+        while column_number > 0:
+            column_number, remainder = divmod(column_number - 1, 26)
+            letters = chr(ord('A') + remainder) + letters
+        return letters
+
     def get_sheets_service(self):
+        if self.sheets_service is not None:
+            return self.sheets_service
+
         try:
             sheets_creds_file = self.config.SHEETS_CREDS_FILE
 
@@ -53,10 +59,17 @@ class DataHandler:
             sheet_id = self.extract_sheet_id(sheet_url)
             service = self.get_sheets_service()
 
-            sheet_metadata = service.spreadsheets().get(spreadsheetId=sheet_id).execute()
-            sheet_name = sheet_metadata.get('sheets', [{}])[0].get('properties', {}).get('title', 'Sheet1')
+            sheet_metadata = service.spreadsheets().get(
+                spreadsheetId=sheet_id,
+                fields='sheets.properties'
+            ).execute()
+            sheet_properties = sheet_metadata.get('sheets', [{}])[0].get('properties', {})
+            sheet_name = sheet_properties.get('title', 'Sheet1')
+            grid_properties = sheet_properties.get('gridProperties', {})
+            row_count = grid_properties.get('rowCount', 10000)
+            column_count = grid_properties.get('columnCount', 702)
 
-            range_name = f"{sheet_name}!A1:ZZ10000"
+            range_name = f"{sheet_name}!A1:{self.column_letter(column_count)}{row_count}"
             result = service.spreadsheets().values().get(
                 spreadsheetId=sheet_id,
                 range=range_name
@@ -66,9 +79,15 @@ class DataHandler:
             if not values:
                 raise ValueError("No data found in sheet.")
 
-            df = pd.DataFrame(values[1:], columns=values[0])
-            df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-            return df.dropna(how='all').dropna(axis=1, how='all')
+            headers = [str(header).strip().lower().replace(' ', '_') for header in values[0]]
+            width = len(headers)
+            rows = (row[:width] + [None] * (width - len(row)) for row in values[1:])
+            columns = list(zip(*rows)) or [()] * width
+
+            df = pd.DataFrame(dict(enumerate(columns)))
+            df.columns = headers
+            present = df.notna()
+            return df.loc[present.any(axis=1), present.any(axis=0)]
 
         except HttpError as e:
             logging.error(f"Google Sheets API error: {e}")
@@ -81,6 +100,13 @@ class DataHandler:
 
     def read_csv(self, file) -> pd.DataFrame:
         try:
+            return pd.read_csv(file, engine='pyarrow')
+        except Exception as e:
+            logging.warning(f"PyArrow CSV parsing failed, falling back to default parser: {e}")
+
+        try:
+            if hasattr(file, 'seek'):
+                file.seek(0)
             return pd.read_csv(file)
         except Exception as e:
             logging.error(f"Error reading CSV file: {e}")
@@ -1,27 +1,44 @@
 import base64
-import json
 import logging
 import os
+import random
 import time
-from datetime import datetime, timedelta
+from datetime import datetime
+from functools import lru_cache
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from pathlib import Path
-from typing import Dict, List, Optional
-import smtplib
-import pandas as pd
+from typing import Dict, List, Optional, Tuple
+import orjson
 import redis
 import requests
-import streamlit as st
+from requests.adapters import HTTPAdapter
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from google.auth.transport.requests import Request
-from dotenv import load_dotenv
 from config import Config
-load_dotenv()
+
+
+@lru_cache(maxsize=None)
+def get_redis_pool(redis_url: str) -> redis.ConnectionPool:
+    return redis.ConnectionPool.from_url(
+        redis_url,
+        max_connections=100,
+        decode_responses=True,
+        socket_timeout=5,
+        socket_keepalive=True,
+        retry_on_timeout=True
+    )
+
+
+def backoff_delay(attempt: int, base: float = 2.0, cap: float = 30.0) -> float:
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
 
 class EmailHandler:
+    GMAIL_BATCH_SIZE = 50
+    GMAIL_TOKEN_KEY = 'gmail:access_token'
+    GMAIL_TOKEN_LOCK_KEY = 'gmail:token:lock'
+    BATCH_STATUS_TTL = 7 * 24 * 60 * 60
+
     def __init__(self, config: Config):
         self.config = config
         self.smtp_settings = {
@@ -29,23 +46,21 @@ class EmailHandler:
             'port': 587,
             'user': config.GMAIL_USER,
         }
+        self.http_session = requests.Session()
+        http_adapter = HTTPAdapter(pool_connections=10, pool_maxsize=32)
+        self.http_session.mount('https://', http_adapter)
+        self.http_session.mount('http://', http_adapter)
 
         if self._initialize_redis():
             self._setup_gmail_oauth()
 
     def _initialize_redis(self) -> bool:
         max_retries = 5
-        retry_delay = 2
 
         for attempt in range(max_retries):
             try:
                 redis_url = os.getenv('REDIS_URL', self.config.REDIS_URL)
-                self.redis_client = redis.Redis.from_url(
-                    redis_url,
-                    decode_responses=True,
-                    socket_timeout=5,
-                    retry_on_timeout=True
-                )
+                self.redis_client = redis.Redis(connection_pool=get_redis_pool(redis_url))
 
                 self.redis_client.ping()
                 logging.info("Successfully connected to Redis")
@@ -54,9 +69,10 @@ class EmailHandler:
             except redis.ConnectionError as e:
                 logging.warning(f"Redis connection attempt {attempt + 1} failed: {str(e)}")
                 if attempt == max_retries - 1:
+                    import streamlit as st
                     st.error(f"Failed to connect to Redis after {max_retries} attempts.")
                     return False
-                time.sleep(retry_delay)
+                time.sleep(backoff_delay(attempt))
 
             except Exception as e:
                 logging.error(f"Unexpected Redis error: {str(e)}")
@@ -81,7 +97,7 @@ class EmailHandler:
                 "html": content
             }
 
-            response = requests.post(url, headers=headers, json=payload)
+            response = self.http_session.post(url, headers=headers, data=orjson.dumps(payload))
             if response.status_code not in [200, 202]:
                 logging.error(f"Resend API error: {response.status_code} - {response.text}")
                 return False
@@ -93,64 +109,196 @@ class EmailHandler:
             logging.error(f"Resend sending error: {str(e)}")
             return False
 
-    def send_email(self, to_email: str, subject: str, content: str, batch_id: str = None) -> bool:
-        max_retries = 3
-        retry_delay = 2
-        
+    def send_email(self, to_email: str, subject: str, content: str, batch_id: str = None,
+                   max_retries: int = 3, record_failures: bool = True) -> bool:
+        return self.send_email_batch([(to_email, subject, content)], batch_id=batch_id,
+                                     max_retries=max_retries, record_failures=record_failures)[0]
+
+    def send_email_batch(self, messages: List[Tuple[str, str, str]], batch_id: str = None,
+                         max_retries: int = 3, record_failures: bool = True) -> List[bool]:
+        results = [False] * len(messages)
+        errors = {}
+        remaining = list(range(len(messages)))
+        redis_client = getattr(self, 'redis_client', None)
+        status_pipe = redis_client.pipeline(transaction=False) if batch_id and redis_client else None
+
         for attempt in range(max_retries):
             try:
-                if not hasattr(self, 'gmail_creds') or not self.gmail_creds:
-                    logging.error("Gmail credentials not initialized")
-                    raise Exception("Gmail not authenticated. Please complete OAuth setup.")
-
-                if not self.gmail_creds.valid:
-                    if self.gmail_creds.expired and self.gmail_creds.refresh_token:
-                        self.gmail_creds.refresh(Request())
-                    else:
-                        raise Exception("Invalid Gmail credentials. Please re-authenticate.")
-
-                service = build('gmail', 'v1', credentials=self.gmail_creds)
-                message = MIMEMultipart()
-                message['to'] = to_email
-                message['from'] = self.config.GMAIL_USER
-                message['subject'] = subject
-                message.attach(MIMEText(content, 'html'))
-
-                raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-                sent_message = service.users().messages().send(
-                    userId='me',
-                    body={'raw': raw_message}
-                ).execute()
-
-                if batch_id:
-                    metadata = {
-                        'email': to_email,
-                        'status': 'sent',
-                        'timestamp': datetime.now().isoformat(),
-                        'message_id': sent_message.get('id')
-                    }
-                    self.store_in_redis(f"{batch_id}:{to_email}", json.dumps(metadata))
-
-                logging.info(f"Email sent successfully to {to_email}")
-                return True
+                self._refresh_credentials_if_needed()
+                service = self._get_gmail_service()
+
+                for start in range(0, len(remaining), self.GMAIL_BATCH_SIZE):
+                    chunk = remaining[start:start + self.GMAIL_BATCH_SIZE]
+                    try:
+                        self._execute_gmail_batch(service, messages, chunk, results, errors, batch_id, status_pipe)
+                    except Exception as e:
+                        logging.error(f"Gmail batch request failed: {str(e)}")
+                        errors.update((index, str(e)) for index in chunk if not results[index])
 
             except Exception as e:
-                logging.error(f"Attempt {attempt + 1} failed: {str(e)}")
-                if attempt < max_retries - 1:
-                    time.sleep(retry_delay)
-                    continue
-                else:
-                    error_msg = f"Failed to send email to {to_email} after {max_retries} attempts: {str(e)}"
-                    logging.error(error_msg)
-                    if batch_id:
-                        metadata = {
-                            'email': to_email,
-                            'status': 'failed',
-                            'error': str(e),
-                            'timestamp': datetime.now().isoformat()
-                        }
-                        self.store_in_redis(f"{batch_id}:{to_email}", json.dumps(metadata))
-                    return False
+                errors.update((index, str(e)) for index in remaining)
+
+            self._flush_status_pipeline(status_pipe, batch_id)
+            remaining = [index for index in remaining if not results[index]]
+            if not remaining:
+                break
+
+            logging.error(f"Attempt {attempt + 1} failed for {len(remaining)} of {len(messages)} emails")
+            if attempt < max_retries - 1:
+                time.sleep(backoff_delay(attempt))
+
+        for index in remaining:
+            to_email = messages[index][0]
+            error = errors.get(index, 'Unknown error')
+            logging.error(f"Failed to send email to {to_email} after {max_retries} attempts: {error}")
+            if batch_id and record_failures:
+                self._store_send_status(batch_id, to_email, 'failed', pipe=status_pipe, error=error)
+
+        self._flush_status_pipeline(status_pipe, batch_id)
+        return results
+
+    def _execute_gmail_batch(self, service, messages: List[Tuple[str, str, str]], indices: List[int],
+                             results: List[bool], errors: Dict[int, str], batch_id: str = None,
+                             status_pipe=None):
+        def on_sent(request_id, response, exception):
+            index = int(request_id)
+            if exception is not None:
+                errors[index] = str(exception)
+                return
+
+            results[index] = True
+            to_email = messages[index][0]
+            logging.info(f"Email sent successfully to {to_email}")
+            if batch_id:
+                self._store_send_status(batch_id, to_email, 'sent', pipe=status_pipe, message_id=response.get('id'))
+
+        batch = service.new_batch_http_request(callback=on_sent)
+        message_key, message = None, None
+        for index in indices:
+            to_email, subject, content = messages[index]
+            if (subject, content) != message_key:
+                message_key = (subject, content)
+                message = self._build_mime_message(subject, content)
+
+            batch.add(
+                service.users().messages().send(
+                    userId='me',
+                    body={'raw': self._encode_message(message, to_email)}
+                ),
+                request_id=str(index)
+            )
+
+        batch.execute()
+
+    def _refresh_credentials_if_needed(self):
+        if not hasattr(self, 'gmail_creds') or not self.gmail_creds:
+            logging.error("Gmail credentials not initialized")
+            raise Exception("Gmail not authenticated. Please complete OAuth setup.")
+
+        if not self.gmail_creds.valid:
+            if self.gmail_creds.expired and self.gmail_creds.refresh_token:
+                if not self._apply_cached_token():
+                    self._refresh_gmail_token()
+            else:
+                raise Exception("Invalid Gmail credentials. Please re-authenticate.")
+
+    def _refresh_gmail_token(self):
+        lock = None
+        try:
+            lock = self.redis_client.lock(self.GMAIL_TOKEN_LOCK_KEY, timeout=30, blocking_timeout=10)
+            if not lock.acquire():
+                lock = None
+        except Exception as e:
+            logging.warning(f"Could not lock Gmail token refresh: {str(e)}")
+            lock = None
+
+        try:
+            if self._apply_cached_token():
+                return
+            self.gmail_creds.refresh(Request())
+            self._store_creds_in_redis()
+        finally:
+            if lock is not None:
+                try:
+                    lock.release()
+                except Exception as e:
+                    logging.warning(f"Could not release Gmail token lock: {str(e)}")
+
+    def _apply_cached_token(self) -> bool:
+        try:
+            cached = self.redis_client.get(self.GMAIL_TOKEN_KEY)
+            if not cached:
+                return False
+            token_info = orjson.loads(cached)
+            self.gmail_creds.token = token_info['token']
+            self.gmail_creds.expiry = datetime.fromisoformat(token_info['expiry'])
+        except Exception as e:
+            logging.warning(f"Could not load Gmail token from Redis: {str(e)}")
+            return False
+        return self.gmail_creds.valid
+
+    def _store_creds_in_redis(self):
+        if not self.gmail_creds or not self.gmail_creds.expiry:
+            return
+
+        ttl = int((self.gmail_creds.expiry - datetime.utcnow()).total_seconds()) - 30
+        if ttl <= 0:
+            return
+
+        try:
+            token_info = {
+                'token': self.gmail_creds.token,
+                'expiry': self.gmail_creds.expiry.isoformat(),
+            }
+            self.redis_client.set(self.GMAIL_TOKEN_KEY, orjson.dumps(token_info), ex=ttl)
+        except Exception as e:
+            logging.warning(f"Could not cache Gmail token in Redis: {str(e)}")
+
+    def _build_raw_message(self, to_email: str, subject: str, content: str) -> str:
+        return self._encode_message(self._build_mime_message(subject, content), to_email)
+
+    def _build_mime_message(self, subject: str, content: str) -> MIMEMultipart:
+        message = MIMEMultipart()
+        message['from'] = self.config.GMAIL_USER
+        message['subject'] = subject
+        message.attach(MIMEText(content, 'html'))
+        return message
+
+    def _encode_message(self, message: MIMEMultipart, to_email: str) -> str:
+        del message['to']
+        message['to'] = to_email
+        return base64.urlsafe_b64encode(message.as_bytes()).decode('ascii')
+
+    def _store_send_status(self, batch_id: str, to_email: str, status: str, pipe=None, **details) -> bool:
+        metadata = {
+            'email': to_email,
+            'status': status,
+            'timestamp': datetime.now().isoformat(),
+            **details
+        }
+        batch_key = f"batch:{batch_id}"
+        try:
+            status_pipe = pipe if pipe is not None else self.redis_client.pipeline(transaction=False)
+            status_pipe.hset(batch_key, to_email, orjson.dumps(metadata).decode())
+        except Exception as e:
+            logging.error(f"Redis storage error: {str(e)}")
+            return False
+
+        if pipe is None:
+            return self._flush_status_pipeline(status_pipe, batch_id)
+        return True
+
+    def _flush_status_pipeline(self, pipe, batch_id: str = None) -> bool:
+        if pipe is None or not len(pipe):
+            return True
+        try:
+            if batch_id:
+                pipe.expire(f"batch:{batch_id}", self.BATCH_STATUS_TTL)
+            pipe.execute()
+            return True
+        except Exception as e:
+            logging.error(f"Redis storage error: {str(e)}")
+            return False
 
     def _simulate_email_send(self, to_email: str, subject: str, content: str) -> bool:
         logging.info(f"Simulating email send to {to_email} with subject '{subject}'.")
@@ -168,13 +316,16 @@ class EmailHandler:
             self.token_path = self.config.GMAIL_TOKEN_FILE
 
             self.gmail_creds = None
+            self.gmail_service = None
             if os.path.exists(self.token_path):
                 self.gmail_creds = Credentials.from_authorized_user_file(self.token_path, self.GMAIL_SCOPES)
 
             if not self.gmail_creds or not self.gmail_creds.valid:
                 if self.gmail_creds and self.gmail_creds.expired and self.gmail_creds.refresh_token:
-                    self.gmail_creds.refresh(Request())
+                    if not self._apply_cached_token():
+                        self._refresh_gmail_token()
                 else:
+                    from google_auth_oauthlib.flow import InstalledAppFlow
                     flow = InstalledAppFlow.from_client_secrets_file(
                         self.credentials_path, self.GMAIL_SCOPES
                     )
@@ -183,25 +334,28 @@ class EmailHandler:
                 with open(self.token_path, 'w') as token:
                     token.write(self.gmail_creds.to_json())
 
+            self._store_creds_in_redis()
+            self._get_gmail_service()
+
         except Exception as e:
             if 'error' in str(e).lower() and 'invalid_scope' in str(e).lower():
                 logging.error(f"Requested scopes: {self.GMAIL_SCOPES}. Verify these scopes in your Google Cloud project.")
             logging.error(f"Gmail OAuth setup error: {str(e)}")
 
 
+    def _get_gmail_service(self):
+        if getattr(self, 'gmail_service', None) is None:
+            from googleapiclient.discovery import build
+            self.gmail_service = build('gmail', 'v1', credentials=self.gmail_creds, cache_discovery=False)
+        return self.gmail_service
 
     def _send_via_gmail(self, to_email: str, subject: str, content: str) -> bool:
         try:
             if not self.gmail_creds:
                 raise Exception("Gmail not authenticated. Please complete OAuth setup.")
 
-            service = build('gmail', 'v1', credentials=self.gmail_creds)
-            message = MIMEMultipart()
-            message['to'] = to_email
-            message['subject'] = subject
-            message.attach(MIMEText(content, 'html'))
-
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
+            service = self._get_gmail_service()
+            raw_message = self._build_raw_message(to_email, subject, content)
             service.users().messages().send(
                 userId='me',
                 body={'raw': raw_message}
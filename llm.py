@@ -1,10 +1,8 @@
 from groq import Groq
-from tenacity import retry, stop_after_attempt, wait_exponential
+from tenacity import retry, stop_after_attempt, wait_random_exponential
 import logging
-from typing import Dict, Any, Optional
-from dotenv import load_dotenv
+from typing import Optional
 from config import Config
-load_dotenv()
 
 
 class LLMProcessor:
@@ -13,7 +11,7 @@ class LLMProcessor:
             raise ValueError("GROQ_API_KEY is required in the configuration")
         self.client = Groq(api_key=config.GROQ_API_KEY)
 
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=4, max=10))
+    @retry(stop=stop_after_attempt(3), wait=wait_random_exponential(multiplier=1, max=30))
     def generate_email(self, prompt: str, placeholders: list, temperature: float = 0.7) -> Optional[str]:
         try:
             placeholder_str = ", ".join([f"{{{{{placeholder}}}}}" for placeholder in placeholders])
@@ -46,16 +44,3 @@ class LLMProcessor:
         except Exception as e:
             logging.error(f"Email generation failed: {e}")
             return None
-
-            
-    def process_content(self, email_content: str, context: Dict[str, Any]) -> str:
-        try:
-            content_with_placeholders = email_content
-            for key, value in context['variables'].items():
-                content_with_placeholders = content_with_placeholders.replace(f"{{{{{key}}}}}", str(value))
-            return content_with_placeholders
-        except Exception as e:
-            logging.error(f"Content processing failed: {e}")
-            return email_content
-
-
@@ -1,31 +1,67 @@
+import io
 import os
 import pandas as pd
 import streamlit as st
 from datetime import datetime
-from email_handlers import EmailHandler
+from email_handlers import EmailHandler, get_redis_pool
 from visualizations import create_status_visualization, create_timeline_visualization
-from config import Config
+from config import get_config
+from data_handlers import DataHandler
 from llm import LLMProcessor
+from celery import group
+from tasks import send_email_batch
 import logging
 import redis
-import json
+import orjson
+import re
+
+
+def optimize_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    for col in df.select_dtypes('integer').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    for col in df.select_dtypes('object').columns:
+        if col != 'email' and df[col].nunique() < 0.5 * len(df):
+            df[col] = df[col].astype('category')
+    return df
+
+
+@st.cache_data(ttl=3600)
+def load_csv(data: bytes) -> pd.DataFrame:
+    return optimize_dtypes(DataHandler(get_config()).read_csv(io.BytesIO(data)))
+
+
+@st.cache_data(ttl=15)
+def load_batch_status(_redis_client, batch_id):
+    batch_data = _redis_client.hgetall(f"batch:{batch_id}")
+    return [orjson.loads(value) for value in batch_data.values()]
+
 
 class EmailProcessingApp:
     def __init__(self):
-        self.config = Config.from_env()
-        self.redis_client = redis.StrictRedis.from_url(self.config.REDIS_URL, decode_responses=True)
-        self.email_handler = EmailHandler(self.config)
+        self.config = get_config()
+        self.redis_client = redis.Redis(connection_pool=get_redis_pool(self.config.REDIS_URL))
         self.llm_processor = LLMProcessor(config=self.config)
         
     def _get_available_placeholders(self, df):
         return [col for col in df.columns if col != 'email']
 
+    def _build_placeholder_pattern(self, placeholders):
+        if not placeholders:
+            return None
+        names = '|'.join(re.escape(p) for p in sorted(placeholders, key=len, reverse=True))
+        return re.compile(r"\{\{(" + names + r")\}\}|\{(" + names + r")\}")
+
+    def _render_template(self, pattern, template, values):
+        if pattern is None:
+            return template
+        return pattern.sub(lambda match: values[match.group(1) or match.group(2)], template)
+
     def _setup_email_template(self):
         st.subheader("Email Template Setup")
         
         uploaded_file = st.file_uploader("Upload Recipient List (CSV)", type="csv")
         if uploaded_file is not None:
-            df = pd.read_csv(uploaded_file)
+            df = load_csv(uploaded_file.getvalue())
             st.write("Preview of uploaded data:")
             st.dataframe(df.head())
 
@@ -84,60 +120,80 @@ class EmailProcessingApp:
                     batch_id = f"batch_{datetime.now().strftime('%Y%m%d%H%M%S')}"
                     processed_batch = self._process_emails(df, batch_id, subject, edited_template)
                     if processed_batch:
-                        st.success(f"Emails sent successfully! Batch ID: {batch_id}")
+                        st.success(f"Emails queued for sending! Batch ID: {batch_id}")
                     else:
-                        st.error("Failed to send emails. Please check logs.")
+                        st.error("Failed to queue emails. Please check logs.")
 
     def _preview_emails(self, df, subject, template):
-        for idx, row in df.head(3).iterrows():
-            placeholders = {col: row[col] for col in df.columns if col != 'email'}
-            try:
-                formatted_content = template.format(**placeholders)
-                formatted_subject = subject.format(**placeholders)
-                
-                st.write(f"Preview {idx + 1}:")
-                st.write(f"To: {row['email']}")
-                st.write(f"Subject: {formatted_subject}")
-                st.write("Body:")
-                st.write(formatted_content)
-                st.divider()
-            except KeyError as e:
-                st.error(f"Invalid placeholder: {e}")
+        pattern = self._build_placeholder_pattern(self._get_available_placeholders(df))
+        for idx, row in enumerate(df.head(3).astype(str).to_dict('records')):
+            formatted_content = self._render_template(pattern, template, row)
+            formatted_subject = self._render_template(pattern, subject, row)
+            
+            st.write(f"Preview {idx + 1}:")
+            st.write(f"To: {row['email']}")
+            st.write(f"Subject: {formatted_subject}")
+            st.write("Body:")
+            st.write(formatted_content)
+            st.divider()
 
     def _process_emails(self, df, batch_id, subject, template):
         email_status = []
+        messages = []
+        pattern = self._build_placeholder_pattern(self._get_available_placeholders(df))
         
-        for _, row in df.iterrows():
+        for row in df.astype(str).to_dict('records'):
             try:
-                placeholders = {col: row[col] for col in df.columns if col != 'email'}
-                formatted_content = template.format(**placeholders)
-                formatted_subject = subject.format(**placeholders)
-                
-                success = self.email_handler.send_email(
-                    to_email=row['email'],
-                    subject=formatted_subject,
-                    content=formatted_content
-                )
-                
-                status = {
-                    "email": row['email'],
-                    "status": "Sent" if success else "Failed",
-                    "timestamp": datetime.now().isoformat()
-                }
-                email_status.append(status)
+                formatted_content = self._render_template(pattern, template, row)
+                formatted_subject = self._render_template(pattern, subject, row)
+                messages.append((row['email'], formatted_subject, formatted_content))
                 
             except Exception as e:
-                logging.error(f"Failed to send email to {row['email']}: {e}")
+                logging.error(f"Failed to prepare email to {row['email']}: {e}")
                 email_status.append({
                     "email": row['email'],
-                    "status": "Failed",
+                    "status": "failed",
                     "error": str(e),
                     "timestamp": datetime.now().isoformat()
                 })
-        
-        self.redis_client.set(batch_id, json.dumps(email_status))
+
+        for to_email, _, _ in messages:
+            email_status.append({
+                "email": to_email,
+                "status": "queued",
+                "timestamp": datetime.now().isoformat()
+            })
+
+        self._store_batch_status(batch_id, email_status)
+
+        if messages:
+            try:
+                group(
+                    send_email_batch.s(messages[start:start + EmailHandler.GMAIL_BATCH_SIZE], batch_id=batch_id)
+                    for start in range(0, len(messages), EmailHandler.GMAIL_BATCH_SIZE)
+                ).apply_async()
+            except Exception as e:
+                logging.error(f"Failed to queue batch {batch_id}: {e}")
+                unsent = [status for status in email_status if status['status'] == 'queued']
+                for status in unsent:
+                    status.update(status='failed', error=str(e), timestamp=datetime.now().isoformat())
+                self._store_batch_status(batch_id, unsent)
+                return None
+
         return email_status
 
+    def _store_batch_status(self, batch_id, email_status):
+        batch_key = f"batch:{batch_id}"
+        batch_size = self.config.REDIS_BATCH_SIZE
+        pipe = self.redis_client.pipeline(transaction=False)
+        for start in range(0, len(email_status), batch_size):
+            pipe.hset(batch_key, mapping={
+                status['email']: orjson.dumps(status).decode()
+                for status in email_status[start:start + batch_size]
+            })
+            pipe.expire(batch_key, EmailHandler.BATCH_STATUS_TTL)
+            pipe.execute()
+
     def run(self):
         st.title("Email Processing Application")
         st.sidebar.title("Navigation")
@@ -146,19 +202,23 @@ class EmailProcessingApp:
         if tabs == "Email Template":
             self._setup_email_template()
         elif tabs == "Analytics Dashboard":
-            self._show_analytics_dashboard()
+            batch_id = st.sidebar.text_input("Batch ID")
+            if batch_id:
+                self._show_analytics_dashboard(batch_id)
 
     def _show_analytics_dashboard(self, batch_id):
         st.subheader("Analytics Dashboard")
 
         try:
-            batch_data = self.redis_client.get(batch_id)
-            if batch_data:
-                email_status = json.loads(batch_data)
+            email_status = load_batch_status(self.redis_client, batch_id)
+            if email_status:
                 df = pd.DataFrame(email_status)
 
                 st.write("Email Status Data:")
-                st.dataframe(df)
+                if len(df) > 500 and not st.checkbox(f"Show all {len(df)} rows"):
+                    st.dataframe(df.head(500))
+                else:
+                    st.dataframe(df)
 
                 st.write("Email Status Visualization:")
                 create_status_visualization(email_status)
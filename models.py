@@ -1,7 +1,10 @@
-from dataclasses import dataclass
+import sys
+from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 
-@dataclass
+DATACLASS_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+@dataclass(**DATACLASS_OPTIONS)
 class SearchResult:
     title: str
     link: str
@@ -28,15 +31,11 @@ class SearchResult:
             "author": self.author,
         }
 
-@dataclass
+@dataclass(**DATACLASS_OPTIONS)
 class ExtractionResult:
     entity: str
-    extracted_info: List[str] = None
-    source_urls: List[str] = None
-
-    def __post_init__(self):
-        self.extracted_info = self.extracted_info or []
-        self.source_urls = self.source_urls or []
+    extracted_info: List[str] = field(default_factory=list)
+    source_urls: List[str] = field(default_factory=list)
 
     def to_dict(self) -> Dict[str, Any]:
         return {
@@ -2,27 +2,29 @@ from celery import Celery
 from celery.schedules import crontab
 import os
 from datetime import timedelta
-import logging
-from email_handlers import EmailHandler
-from config import Config
-import json
+from functools import lru_cache
+from email_handlers import EmailHandler, get_redis_pool
+from config import get_config
+import orjson
 import redis
 from celery.utils.log import get_task_logger
 
-config = Config.from_env()
-logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
-
-
+config = get_config()
 logger = get_task_logger(__name__)
-celery = Celery('email_tasks')
-redis_url = os.getenv('REDIS_URL')
-if not redis_url:
-    raise ValueError("REDIS_URL environment variable is required.")
 
-email_rate_limit = os.getenv('EMAIL_RATE_LIMIT', '50/h')
-if not os.getenv('EMAIL_RATE_LIMIT'):
+redis_url = config.REDIS_URL
+
+email_rate_limit = os.getenv('EMAIL_RATE_LIMIT')
+if not email_rate_limit:
     logger.warning("EMAIL_RATE_LIMIT not set. Defaulting to 50/h.")
+    email_rate_limit = '50/h'
+
+email_count, _, rate_unit = email_rate_limit.partition('/')
+batch_rate_limit = f"{float(email_count) / EmailHandler.GMAIL_BATCH_SIZE}/{rate_unit or 's'}"
+
+prefetch_multiplier = int(os.getenv('CELERY_PREFETCH_MULTIPLIER', '2'))
+email_queue_interval = int(os.getenv('EMAIL_QUEUE_INTERVAL', 1))
+email_status_interval = int(os.getenv('EMAIL_STATUS_INTERVAL', 5))
 
 celery = Celery('tasks', broker=redis_url, backend=redis_url)
 celery.conf.update(
@@ -32,9 +34,21 @@ celery.conf.update(
     timezone='UTC',
     enable_utc=True,
     broker_connection_retry_on_startup=True,
+    worker_prefetch_multiplier=prefetch_multiplier,
+    task_acks_late=True,
+    task_reject_on_worker_lost=True,
+    result_compression='gzip',
+    result_expires=300,
+    broker_transport_options={'visibility_timeout': 3600, 'socket_keepalive': True, 'health_check_interval': 30},
+    broker_pool_limit=64,
+    redis_socket_keepalive=True,
+    redis_backend_health_check_interval=30,
     task_annotations={
         'tasks.send_email': {
             'rate_limit': email_rate_limit
+        },
+        'tasks.send_email_batch': {
+            'rate_limit': batch_rate_limit
         }
     }
 )
@@ -42,67 +56,101 @@ celery.conf.update(
 celery.conf.beat_schedule = {
     'process-email-queue': {
         'task': 'tasks.process_email_queue',
-        'schedule': timedelta(minutes=int(os.getenv('EMAIL_QUEUE_INTERVAL', 1))),
+        'schedule': timedelta(minutes=email_queue_interval),
     },
     'update-email-statuses': {
         'task': 'tasks.update_email_statuses',
-        'schedule': timedelta(minutes=int(os.getenv('EMAIL_STATUS_INTERVAL', 5))),
+        'schedule': timedelta(minutes=email_status_interval),
     },
 }
 
-email_handler = EmailHandler(config)
+EMAIL_QUEUE_BATCH_SIZE = 256
+redis_client = redis.Redis(connection_pool=get_redis_pool(config.REDIS_URL))
 
-@celery.task(bind=True, max_retries=3, default_retry_delay=30)
-def send_email(self, to_email, subject, content):
+@lru_cache(maxsize=1)
+def get_email_handler() -> EmailHandler:
+    return EmailHandler(config)
+
+@celery.task(bind=True, ignore_result=True, max_retries=3, default_retry_delay=30)
+def send_email(self, to_email, subject, content, batch_id=None):
+    final_attempt = self.request.retries >= self.max_retries
     try:
-        response = email_handler.send_email(to_email, subject, content)
-        logger.info(f"Email sent to {to_email}: {response}")
+        response = get_email_handler().send_email(to_email, subject, content, batch_id=batch_id,
+                                                  max_retries=1, record_failures=final_attempt)
+        if not response:
+            raise Exception(f"Email handler could not send email to {to_email}")
+        logger.info("Email sent to %s: %s", to_email, response)
         return response
     except Exception as e:
-        logger.error(f"Error sending email to {to_email}: {str(e)}")
+        logger.error("Error sending email to %s: %s", to_email, e)
         self.retry(exc=e)
 
 
-@celery.task(bind=True)
+def _unsent_messages(batch_id, messages):
+    statuses = redis_client.hmget(f"batch:{batch_id}", [message[0] for message in messages])
+    return [
+        message for message, status in zip(messages, statuses)
+        if not status or orjson.loads(status).get('status') != 'sent'
+    ]
+
+
+@celery.task(bind=True, ignore_result=True)
+def send_email_batch(self, messages, batch_id=None):
+    messages = [tuple(message) for message in messages]
+    if batch_id and messages:
+        messages = _unsent_messages(batch_id, messages)
+    results = get_email_handler().send_email_batch(messages, batch_id=batch_id)
+    logger.info("Sent %d of %d emails for batch %s", sum(results), len(messages), batch_id)
+    return results
+
+
+def _dispatch_queued_emails(redis_client, email_keys):
+    dispatched_keys = []
+    for email_key, raw_email in zip(email_keys, redis_client.mget(email_keys)):
+        if raw_email is None:
+            continue
+        try:
+            email_data = orjson.loads(raw_email)
+            logger.info("Dispatching email: %s", email_data['to_email'])
+
+            send_email.delay(
+                email_data['to_email'],
+                email_data['subject'],
+                email_data['content'],
+                batch_id=email_data.get('batch_id')
+            )
+            dispatched_keys.append(email_key)
+
+        except Exception as e:
+            logger.error("Error processing email %s: %s", email_key, e)
+
+    if dispatched_keys:
+        redis_client.delete(*dispatched_keys)
+    return len(dispatched_keys)
+
+
+@celery.task(bind=True, ignore_result=True)
 def process_email_queue(self):
     logger.info("Processing email queue...")
     try:
-        redis_client = redis.StrictRedis.from_url(config.REDIS_URL, decode_responses=True)
-       
-        pending_emails = redis_client.keys("email_queue:*")
-        logger.info(f"Found {len(pending_emails)} pending emails")
-        
-        for email_key in pending_emails:
-            try:
-                email_data = json.loads(redis_client.get(email_key))
-                logger.info(f"Processing email: {email_data['to_email']}")
-                
-                email_handler = EmailHandler(config)
-                success = email_handler.send_email(
-                    to_email=email_data['to_email'],
-                    subject=email_data['subject'],
-                    content=email_data['content'],
-                    batch_id=email_data.get('batch_id')
-                )
-                
-                if success:
-                    redis_client.delete(email_key)
-                    logger.info(f"Successfully sent email to {email_data['to_email']}")
-                else:
-                    logger.error(f"Failed to send email to {email_data['to_email']}")
-                
-            except Exception as e:
-                logger.error(f"Error processing email {email_key}: {str(e)}")
-                continue
+        dispatched = 0
+        email_keys = []
+        for email_key in redis_client.scan_iter(match="email_queue:*", count=1024):
+            email_keys.append(email_key)
+            if len(email_keys) >= EMAIL_QUEUE_BATCH_SIZE:
+                dispatched += _dispatch_queued_emails(redis_client, email_keys)
+                email_keys = []
+        if email_keys:
+            dispatched += _dispatch_queued_emails(redis_client, email_keys)
                 
-        logger.info("Email queue processed successfully.")
+        logger.info("Email queue processed successfully. Dispatched %d emails.", dispatched)
         return True
         
     except Exception as e:
-        logger.error(f"Error processing email queue: {str(e)}")
+        logger.error("Error processing email queue: %s", e)
         return False
 
-@celery.task(bind=True)
+@celery.task(bind=True, ignore_result=True)
 def update_email_statuses(self):
     logger.info("Updating email statuses...")
     try:
@@ -110,5 +158,5 @@ def update_email_statuses(self):
         logger.info("Email statuses updated successfully.")
         return result
     except Exception as e:
-        logger.error(f"Error updating email statuses: {str(e)}")
+        logger.error("Error updating email statuses: %s", e)
         self.retry(exc=e)
@@ -1,37 +1,44 @@
-import matplotlib.pyplot as plt
+import io
+from collections import Counter
+from matplotlib.figure import Figure
 import seaborn as sns
 import pandas as pd
 import matplotlib.dates as mdates
 from datetime import datetime
 import streamlit as st
 
-def create_status_visualization(email_status):
-    df = pd.DataFrame(email_status)
-    status_counts = df['status'].value_counts()
-    plt.figure(figsize=(10, 6))
-    sns.barplot(
-        x=status_counts.index,
-        y=status_counts.values,
-        hue=status_counts.index,
-        legend=False
-    )
-    plt.title('Email Status Distribution')
-    plt.xlabel('Status')
-    plt.ylabel('Count')
-    st.pyplot(plt)
+def figure_to_png(fig):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format='png', bbox_inches='tight')
+    return buffer.getvalue()
 
-def create_timeline_visualization(email_status):
+@st.cache_data(ttl=15)
+def render_status_chart(email_status):
+    status_counts = Counter(row['status'] for row in email_status).most_common()
+    labels, counts = zip(*status_counts) if status_counts else ((), ())
+    fig = Figure(figsize=(10, 6))
+    ax = fig.subplots()
+    ax.bar(labels, counts, color=sns.color_palette(n_colors=len(labels)))
+    ax.set(title='Email Status Distribution', xlabel='Status', ylabel='Count')
+    return figure_to_png(fig)
+
+@st.cache_data(ttl=15)
+def render_timeline_chart(email_status):
     df = pd.DataFrame(email_status)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df['timestamp'] = pd.to_datetime(df['timestamp'], format='ISO8601')
     
-    plt.figure(figsize=(12, 6))
-    sns.scatterplot(
-        data=df,
-        x='timestamp',
-        y='status',
-        hue='status',
-        style='status'
-    )
-    plt.title('Email Sending Timeline')
-    plt.xticks(rotation=45)
-    st.pyplot(plt)
\ No newline at end of file
+    fig = Figure(figsize=(12, 6))
+    ax = fig.subplots()
+    groups = df.groupby('status', sort=False)
+    for (status, group), color in zip(groups, sns.color_palette(n_colors=groups.ngroups)):
+        ax.scatter(group['timestamp'], group['status'], s=20, color=color, label=status)
+    ax.legend(title='status')
+    ax.set_title('Email Sending Timeline')
+    ax.tick_params(axis='x', labelrotation=45)
+    return figure_to_png(fig)
+
+def create_status_visualization(email_status):
+    st.image(render_status_chart(email_status), use_column_width=True)
+
+def create_timeline_visualization(email_status):
+    st.image(render_timeline_chart(email_status), use_column_width=True)
\ No newline at end of file